@@ -34,9 +34,13 @@ import argparse
 import collections
 import dataclasses
 import datetime
+import hashlib
+import io
 import os.path
+import pickle
 import subprocess
 import sys
+import tempfile
 import xml
 from typing import Dict, List, Set, Optional
 
@@ -105,20 +109,20 @@ class ReportData:
 # Generate a dot file containing the transitive closure of the module.
 def generate_dot_file(modules: Dict[ModuleInfo, Set[ModuleInfo]],
                       converted: Set[str], show_converted: bool):
-  # Check that all modules in the argument are in the list of converted modules
-  all_converted = lambda modules: all(
-      m.is_converted(converted) for m in modules)
+  # every dependency is also a key of modules, so converted deps can be
+  # checked and filtered out with set operations
+  converted_modules = {m for m in modules if m.is_converted(converted)}
 
   dot_entries = []
 
   for module, deps in sorted(modules.items()):
 
-    if module.is_converted(converted):
+    if module in converted_modules:
       if show_converted:
         color = "dodgerblue"
       else:
         continue
-    elif all_converted(deps):
+    elif deps <= converted_modules:
       color = "yellow"
     else:
       color = "tomato"
@@ -126,9 +130,9 @@ def generate_dot_file(modules: Dict[ModuleInfo, Set[ModuleInfo]],
     dot_entries.append(
         f'"{module.name}" [label="{module.name}\\n{module.kind}" color=black, style=filled, '
         f"fillcolor={color}]")
+    edge_targets = deps if show_converted else deps - converted_modules
     dot_entries.extend(
-        f'"{module.name}" -> "{dep.name}"' for dep in sorted(deps)
-        if show_converted or not dep.is_converted(converted))
+        f'"{module.name}" -> "{dep.name}"' for dep in sorted(edge_targets))
 
   return """
 digraph mygraph {{
@@ -139,11 +143,27 @@ digraph mygraph {{
 """ % "\n  ".join(dot_entries)
 
 
+def get_unconverted_deps(
+    modules: Dict[ModuleInfo, Set[ModuleInfo]],
+    converted: Set[str]) -> Dict[ModuleInfo, Set[ModuleInfo]]:
+  """Returns the deps of each module that are neither converted nor skipped."""
+  # every dependency is also a key of modules, so unconverted deps can be
+  # found with a set difference rather than checking each dep
+  converted_or_skipped = {
+      m for m in modules if m.is_converted_or_skipped(converted)
+  }
+  return {
+      module: deps - converted_or_skipped for module, deps in modules.items()
+  }
+
+
 # Generate a report for each module in the transitive closure, and the blockers for each module
 def generate_report_data(modules: Dict[ModuleInfo, Set[ModuleInfo]],
                          converted: Set[str],
                          input_modules_names: Set[str],
                          show_converted: bool = False) -> ReportData:
+  unconverted = get_unconverted_deps(modules, converted)
+
   # Map of [number of unconverted deps] to list of entries,
   # with each entry being the string: "<module>: <comma separated list of unconverted modules>"
   blocked_modules = collections.defaultdict(set)
@@ -152,16 +172,14 @@ def generate_report_data(modules: Dict[ModuleInfo, Set[ModuleInfo]],
   # (i.e. reverse deps)
   all_unconverted_modules = collections.defaultdict(set)
 
-  dirs_with_unconverted_modules = set()
-  kind_of_unconverted_modules = set()
+  unconverted_modules = []
 
   input_all_deps = set()
   input_unconverted_deps = set()
   input_modules = set()
 
-  for module, deps in sorted(modules.items()):
-    unconverted_deps = set(
-        dep.name for dep in deps if not dep.is_converted_or_skipped(converted))
+  for module, deps in modules.items():
+    unconverted_deps = {dep.name for dep in unconverted[module]}
 
     # replace deps count with transitive deps rather than direct deps count
     module = ModuleInfo(
@@ -176,7 +194,11 @@ def generate_report_data(modules: Dict[ModuleInfo, Set[ModuleInfo]],
     for dep in unconverted_deps:
       all_unconverted_modules[dep].add(module)
 
-    if not module.is_converted_or_skipped(converted) or (
+    module_converted_or_skipped = module.is_converted_or_skipped(converted)
+    if not module_converted_or_skipped:
+      unconverted_modules.append(module)
+
+    if not module_converted_or_skipped or (
         show_converted and not module.is_converted_or_skipped(set())):
       if show_converted:
         full_deps = set(f"{dep.short_string(converted)}" for dep in deps)
@@ -184,10 +206,6 @@ def generate_report_data(modules: Dict[ModuleInfo, Set[ModuleInfo]],
       else:
         blocked_modules[module].update(unconverted_deps)
 
-    if not module.is_converted_or_skipped(converted):
-      dirs_with_unconverted_modules.add(module.dirname)
-      kind_of_unconverted_modules.add(module.kind)
-
     if module.name in input_modules_names:
       input_modules.add(InputModule(module, len(deps), len(unconverted_deps)))
       input_all_deps.update(deps)
@@ -199,8 +217,8 @@ def generate_report_data(modules: Dict[ModuleInfo, Set[ModuleInfo]],
       unconverted_deps=input_unconverted_deps,
       all_unconverted_modules=all_unconverted_modules,
       blocked_modules=blocked_modules,
-      dirs_with_unconverted_modules=dirs_with_unconverted_modules,
-      kind_of_unconverted_modules=kind_of_unconverted_modules,
+      dirs_with_unconverted_modules={m.dirname for m in unconverted_modules},
+      kind_of_unconverted_modules={m.kind for m in unconverted_modules},
       converted=converted,
       show_converted=show_converted,
   )
@@ -211,7 +229,7 @@ def generate_proto(report_data, file_name):
       root_modules=[m.module.name for m in report_data.input_modules],
       num_deps=len(report_data.total_deps),
   )
-  for module, unconverted_deps in report_data.blocked_modules.items():
+  for module, unconverted_deps in sorted(report_data.blocked_modules.items()):
     message.unconverted.add(
         name=module.name,
         directory=module.dirname,
@@ -225,66 +243,66 @@ def generate_proto(report_data, file_name):
 
 
 def generate_report(report_data):
-  report_lines = []
+  report = io.StringIO()
   input_module_str = ", ".join(
       str(i) for i in sorted(report_data.input_modules))
 
-  report_lines.append("# bp2build progress report for: %s\n" % input_module_str)
+  report.write(f"# bp2build progress report for: {input_module_str}\n\n")
 
   if report_data.show_converted:
-    report_lines.append(
-        "# progress report includes data both for converted and unconverted modules"
+    report.write(
+        "# progress report includes data both for converted and unconverted modules\n"
     )
 
   total = len(report_data.total_deps)
   unconverted = len(report_data.unconverted_deps)
   converted = total - unconverted
   percent = converted / total * 100
-  report_lines.append(f"Percent converted: {percent:.2f} ({converted}/{total})")
-  report_lines.append(f"Total unique unconverted dependencies: {unconverted}")
-
-  report_lines.append("Ignored module types: %s\n" %
-                      sorted(dependency_analysis.IGNORED_KINDS))
-  report_lines.append("# Transitive dependency closure:")
-
-  current_count = -1
-  for module, unconverted_deps in sorted(
-      report_data.blocked_modules.items(), key=lambda x: len(x[1])):
-    count = len(unconverted_deps)
-    if current_count != count:
-      report_lines.append(f"\n{count} unconverted deps remaining:")
-      current_count = count
-    report_lines.append("{module}: {deps}".format(
-        module=module, deps=", ".join(sorted(unconverted_deps))))
-
-  report_lines.append("\n")
-  report_lines.append("# Unconverted deps of {}:\n".format(input_module_str))
-  for count, dep in sorted(
-      ((len(unconverted), dep)
-       for dep, unconverted in report_data.all_unconverted_modules.items()),
-      reverse=True):
-    report_lines.append("%s: blocking %d modules" % (dep, count))
-
-  report_lines.append("\n")
-  report_lines.append("# Dirs with unconverted modules:\n\n{}".format("\n".join(
-      sorted(report_data.dirs_with_unconverted_modules))))
-
-  report_lines.append("\n")
-  report_lines.append("# Kinds with unconverted modules:\n\n{}".format(
-      "\n".join(sorted(report_data.kind_of_unconverted_modules))))
-
-  report_lines.append("\n")
-  report_lines.append("# Converted modules:\n\n%s" %
-                      "\n".join(sorted(report_data.converted)))
-
-  report_lines.append("\n")
-  report_lines.append(
-      "Generated by: https://cs.android.com/android/platform/superproject/+/master:build/bazel/scripts/bp2build_progress/bp2build_progress.py"
+  report.write(f"Percent converted: {percent:.2f} ({converted}/{total})\n")
+  report.write(f"Total unique unconverted dependencies: {unconverted}\n")
+
+  report.write(
+      f"Ignored module types: {sorted(dependency_analysis.IGNORED_KINDS)}\n\n")
+  report.write("# Transitive dependency closure:\n")
+
+  # group by number of unconverted deps so only each group needs sorting
+  modules_by_count = collections.defaultdict(list)
+  for module, unconverted_deps in report_data.blocked_modules.items():
+    modules_by_count[len(unconverted_deps)].append(module)
+
+  for count, blocked in sorted(modules_by_count.items()):
+    report.write(f"\n{count} unconverted deps remaining:\n")
+    blocked.sort()
+    for module in blocked:
+      deps = ", ".join(sorted(report_data.blocked_modules[module]))
+      report.write(f"{module}: {deps}\n")
+
+  report.write("\n\n")
+  report.write(f"# Unconverted deps of {input_module_str}:\n\n")
+  blocking = report_data.all_unconverted_modules
+  for dep in sorted(blocking, key=lambda d: (len(blocking[d]), d), reverse=True):
+    report.write(f"{dep}: blocking {len(blocking[dep])} modules\n")
+
+  dirs = "\n".join(sorted(report_data.dirs_with_unconverted_modules))
+  report.write("\n\n")
+  report.write(f"# Dirs with unconverted modules:\n\n{dirs}\n")
+
+  kinds = "\n".join(sorted(report_data.kind_of_unconverted_modules))
+  report.write("\n\n")
+  report.write(f"# Kinds with unconverted modules:\n\n{kinds}\n")
+
+  converted_modules = "\n".join(sorted(report_data.converted))
+  report.write("\n\n")
+  report.write(f"# Converted modules:\n\n{converted_modules}\n")
+
+  generated_at = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S %z")
+  report.write("\n\n")
+  report.write(
+      "Generated by: https://cs.android.com/android/platform/superproject/+/master:build/bazel/scripts/bp2build_progress/bp2build_progress.py\n"
   )
-  report_lines.append("Generated at: %s" %
-                      datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S %z"))
+  report.write(f"Generated at: {generated_at}")
 
-  return "\n".join(report_lines)
+  return report.getvalue()
 
 
 def adjacency_list_from_json(
@@ -301,32 +319,27 @@ def adjacency_list_from_json(
   name_to_info = {}
 
   def collect_dependencies(module, deps_names):
-    module_info = None
     name = module["Name"]
-    name_to_info.setdefault(
-        name,
-        ModuleInfo(
-            name=name,
-            created_by=module["CreatedBy"],
-            kind=module["Type"],
-            dirname=os.path.dirname(module["Blueprint"]),
-            num_deps=len(deps_names),
-        ))
-
-    module_info = name_to_info[name]
+    module_info = name_to_info.get(name)
+    if module_info is None:
+      module_info = ModuleInfo(
+          name=name,
+          created_by=module["CreatedBy"],
+          kind=module["Type"],
+          dirname=os.path.dirname(module["Blueprint"]),
+          num_deps=len(deps_names),
+      )
+      name_to_info[name] = module_info
+
+    # a dep may be missing if there is a cycle between a module and created_by
+    # module
+    dep_infos = [name_to_info[dep] for dep in deps_names if dep in name_to_info]
 
     # ensure module_info added to adjacency list even with no deps
-    module_adjacency_list[module_info].update(set())
-    for dep in deps_names:
-      # this may occur if there is a cycle between a module and created_by
-      # module
-      if not dep in name_to_info:
-        continue
-      dep_module_info = name_to_info[dep]
-      module_adjacency_list[module_info].add(dep_module_info)
-      if collect_transitive_dependencies:
-        module_adjacency_list[module_info].update(
-            module_adjacency_list.get(dep_module_info, set()))
+    deps = module_adjacency_list[module_info]
+    deps.update(dep_infos)
+    if collect_transitive_dependencies:
+      deps.update(*(module_adjacency_list.get(dep, ()) for dep in dep_infos))
 
   dependency_analysis.visit_json_module_graph_post_order(
       module_graph, ignore_by_name, ignore_java_auto_deps, filter_by_name, collect_dependencies)
@@ -348,27 +361,25 @@ def adjacency_list_from_queryview_xml(
   name_to_info = {}
 
   def collect_dependencies(module, deps_names):
-    module_info = None
-    name_to_info.setdefault(
-        module.name,
-        ModuleInfo(
-            name=module.name,
-            kind=module.kind,
-            dirname=module.dirname,
-            # required so that it cannot be forgotten when updating num_deps
-            created_by=None,
-            num_deps=len(deps_names),
-        ))
-    module_info = name_to_info[module.name]
+    module_info = name_to_info.get(module.name)
+    if module_info is None:
+      module_info = ModuleInfo(
+          name=module.name,
+          kind=module.kind,
+          dirname=module.dirname,
+          # required so that it cannot be forgotten when updating num_deps
+          created_by=None,
+          num_deps=len(deps_names),
+      )
+      name_to_info[module.name] = module_info
+
+    dep_infos = [name_to_info[dep] for dep in deps_names]
 
     # ensure module_info added to adjacency list even with no deps
-    module_adjacency_list[module_info].update(set())
-    for dep in deps_names:
-      dep_module_info = name_to_info[dep]
-      module_adjacency_list[module_info].add(dep_module_info)
-      if collect_transitive_dependencies:
-        module_adjacency_list[module_info].update(
-            module_adjacency_list.get(dep_module_info, set()))
+    deps = module_adjacency_list[module_info]
+    deps.update(dep_infos)
+    if collect_transitive_dependencies:
+      deps.update(*(module_adjacency_list.get(dep, ()) for dep in dep_infos))
 
   dependency_analysis.visit_queryview_xml_module_graph_post_order(
       module_graph, ignore_by_name, filter_by_name, collect_dependencies)
@@ -376,22 +387,108 @@ def adjacency_list_from_queryview_xml(
   return module_adjacency_list
 
 
+# Directory of cached adjacency lists, relative to the source root.
+_ADJACENCY_LIST_CACHE_DIR = "out/soong/bp2build_progress/adjacency_lists"
+
+
+def _adjacency_list_cache_file(key):
+  digest = hashlib.sha256(repr(key).encode()).hexdigest()
+  return os.path.join(dependency_analysis.SRC_ROOT_DIR,
+                      _ADJACENCY_LIST_CACHE_DIR, f"{digest}.pickle")
+
+
+def _load_cached_adjacency_list(key, graph_stat):
+  try:
+    with open(_adjacency_list_cache_file(key), "rb") as f:
+      cached_key, cached_graph_stat, module_adjacency_list = pickle.load(f)
+  except (OSError, EOFError, AttributeError, ValueError,
+          pickle.UnpicklingError):
+    return None
+  if cached_key != key or cached_graph_stat != graph_stat:
+    return None
+  return module_adjacency_list
+
+
+def _save_cached_adjacency_list(key, graph_stat, module_adjacency_list):
+  cache_file = _adjacency_list_cache_file(key)
+  os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+  # write to a temporary file first so that an interrupted or concurrent run
+  # never leaves a truncated cache file behind
+  with tempfile.NamedTemporaryFile(
+      dir=os.path.dirname(cache_file), delete=False) as f:
+    pickle.dump((key, graph_stat, module_adjacency_list), f)
+  os.replace(f.name, cache_file)
+
+
+def _cached_adjacency_list_from_json(
+    top_level_modules: List[str],
+    ignore_by_name: List[str],
+    ignore_java_auto_deps: bool,
+    collect_transitive_dependencies: bool,
+    banchan_mode: bool,
+) -> Dict[ModuleInfo, Set[ModuleInfo]]:
+  """Returns the adjacency list from the json module graph, cached on disk.
+
+  Entries are keyed on the arguments and invalidated when the module graph's
+  mtime or size changes. The module graph is only decoded on a cache miss.
+  """
+  dependency_analysis.build_json_module_graph(banchan_mode, reuse_outputs=True)
+  stat = os.stat(
+      os.path.join(dependency_analysis.SRC_ROOT_DIR,
+                   dependency_analysis.MODULE_GRAPH_JSON))
+  graph_stat = (stat.st_mtime_ns, stat.st_size)
+  key = (
+      tuple(sorted(top_level_modules)),
+      tuple(sorted(ignore_by_name)),
+      ignore_java_auto_deps,
+      collect_transitive_dependencies,
+      banchan_mode,
+  )
+
+  module_adjacency_list = _load_cached_adjacency_list(key, graph_stat)
+  if module_adjacency_list is None:
+    module_adjacency_list = adjacency_list_from_json(
+        dependency_analysis.read_json_module_graph(),
+        ignore_by_name,
+        ignore_java_auto_deps,
+        top_level_modules,
+        collect_transitive_dependencies,
+    )
+    _save_cached_adjacency_list(key, graph_stat, module_adjacency_list)
+  return module_adjacency_list
+
+
 def get_module_adjacency_list(
     top_level_modules: List[str],
     use_queryview: bool,
     ignore_by_name: List[str],
     ignore_java_auto_deps: bool = False,
     collect_transitive_dependencies: bool = True,
-    banchan_mode: bool = False) -> Dict[ModuleInfo, Set[ModuleInfo]]:
+    banchan_mode: bool = False,
+    use_cache: bool = False) -> Dict[ModuleInfo, Set[ModuleInfo]]:
+  """Returns the adjacency list of the top level modules' dependencies.
+
+  If use_cache is set, existing Soong outputs built for the same product are
+  reused rather than rebuilt, and the adjacency list computed from the json
+  module graph is cached on disk.
+  """
   # The main module graph containing _all_ modules in the Soong build,
   # and the list of converted modules.
   try:
     if use_queryview:
       module_graph = dependency_analysis.get_queryview_module_info(
-          top_level_modules, banchan_mode)
+          top_level_modules, banchan_mode, reuse_outputs=use_cache)
       module_adjacency_list = adjacency_list_from_queryview_xml(
           module_graph, ignore_by_name, top_level_modules,
           collect_transitive_dependencies)
+    elif use_cache:
+      module_adjacency_list = _cached_adjacency_list_from_json(
+          top_level_modules,
+          ignore_by_name,
+          ignore_java_auto_deps,
+          collect_transitive_dependencies,
+          banchan_mode,
+      )
     else:
       module_graph = dependency_analysis.get_json_module_info(banchan_mode)
       module_adjacency_list = adjacency_list_from_json(
@@ -469,6 +566,16 @@ def main():
       action="store_true",
       help="whether to run Soong in a banchan configuration rather than lunch",
   )
+  parser.add_argument(
+      "--cache",
+      action="store_true",
+      help=(
+          "whether to reuse Soong outputs from a previous run instead of"
+          " rebuilding them, and cache the dependencies computed from the"
+          " json module graph. Results may be stale if sources changed since"
+          " those outputs were built"
+      ),
+  )
   parser.add_argument(
       "--proto-file",
       help="Path to write proto output",
@@ -499,14 +606,16 @@ def main():
   banchan_mode = args.banchan
   modules = set(args.module)
 
-  converted = dependency_analysis.get_bp2build_converted_modules()
+  dependency_analysis.build_bp2build(reuse_outputs=args.cache)
+  converted = dependency_analysis.read_bp2build_converted_modules()
 
   module_adjacency_list = get_module_adjacency_list(
       modules,
       use_queryview,
       ignore_by_name,
       collect_transitive_dependencies=mode != "graph",
-      banchan_mode=banchan_mode)
+      banchan_mode=banchan_mode,
+      use_cache=args.cache)
 
   converted = add_created_by_to_converted(converted, module_adjacency_list)
 
@@ -18,8 +18,11 @@
 import bp2build_progress
 import collections
 import dependency_analysis
+import json
+import os
 import queryview_xml
 import soong_module_json
+import tempfile
 import unittest
 import unittest.mock
 
@@ -75,6 +78,45 @@ _soong_module_graph_created_by_loop = [
 ]
 
 
+_soong_module_graph_variants = [
+    soong_module_json.make_module(
+        'a',
+        'type1',
+        blueprint='pkg/Android.bp',
+        deps=[
+            soong_module_json.make_dep(
+                'x',
+                variations=[soong_module_json.make_variation('arch', 'v1')])
+        ]),
+    soong_module_json.make_module(
+        'b',
+        'type1',
+        blueprint='pkg/Android.bp',
+        deps=[
+            soong_module_json.make_dep(
+                'x',
+                variations=[soong_module_json.make_variation('arch', 'v2')])
+        ]),
+    soong_module_json.make_module(
+        'x',
+        'type2',
+        blueprint='pkg/Android.bp',
+        variations=[soong_module_json.make_variation('arch', 'v1')],
+        deps=[soong_module_json.make_dep('y1')]),
+    soong_module_json.make_module(
+        'x',
+        'type2',
+        blueprint='pkg/Android.bp',
+        variations=[soong_module_json.make_variation('arch', 'v2')],
+        deps=[soong_module_json.make_dep('y2')]),
+    soong_module_json.make_module('y1', 'type3', blueprint='pkg/Android.bp'),
+    soong_module_json.make_module('y2', 'type3', blueprint='pkg/Android.bp'),
+]
+
+_module_a = bp2build_progress.ModuleInfo(
+    name='a', kind='type1', dirname='pkg', num_deps=1, created_by='')
+
+
 class Bp2BuildProgressTest(unittest.TestCase):
 
   @unittest.mock.patch(
@@ -238,6 +280,109 @@ class Bp2BuildProgressTest(unittest.TestCase):
     expected_adjacency_dict[b].update(set())
     self.assertDictEqual(adjacency_dict, expected_adjacency_dict)
 
+  @unittest.mock.patch(
+      'dependency_analysis.build_json_module_graph', autospec=True)
+  def test_get_module_adjacency_list_soong_module_cache(self, _):
+    with tempfile.TemporaryDirectory() as src_root, \
+        unittest.mock.patch('dependency_analysis.SRC_ROOT_DIR', src_root), \
+        unittest.mock.patch(
+            'dependency_analysis.read_json_module_graph',
+            wraps=dependency_analysis.read_json_module_graph) as read:
+      module_graph = os.path.join(src_root,
+                                  dependency_analysis.MODULE_GRAPH_JSON)
+      os.makedirs(os.path.dirname(module_graph))
+      with open(module_graph, 'w') as f:
+        json.dump(_soong_module_graph_variants, f)
+
+      def get_module_adjacency_list(top_level_modules,
+                                    collect_transitive_dependencies,
+                                    use_cache=True):
+        return bp2build_progress.get_module_adjacency_list(
+            top_level_modules,
+            False,
+            set(),
+            False,
+            collect_transitive_dependencies,
+            False,
+            use_cache=use_cache)
+
+      # cached results match uncached ones, whose transitive deps only follow
+      # the variants that are actually depended on
+      with unittest.mock.patch(
+          'dependency_analysis.get_json_module_info',
+          autospec=True,
+          return_value=_soong_module_graph_variants):
+        uncached_transitive = get_module_adjacency_list(['a', 'b'],
+                                                        True,
+                                                        use_cache=False)
+        uncached_direct = get_module_adjacency_list(['a', 'b'],
+                                                    False,
+                                                    use_cache=False)
+      transitive = get_module_adjacency_list(['a', 'b'], True)
+      direct = get_module_adjacency_list(['a', 'b'], False)
+      self.assertDictEqual(transitive, uncached_transitive)
+      self.assertDictEqual(direct, uncached_direct)
+      self.assertSetEqual({m.name for m in transitive[_module_a]}, {'x', 'y1'})
+      self.assertEqual(read.call_count, 2)
+      read.reset_mock()
+
+      # a cache hit does not decode the module graph
+      self.assertDictEqual(get_module_adjacency_list(['a', 'b'], True),
+                           transitive)
+      self.assertDictEqual(get_module_adjacency_list(['a', 'b'], False), direct)
+      self.assertEqual(read.call_count, 0)
+
+      # different arguments miss the cache
+      get_module_adjacency_list(['a'], True)
+      self.assertEqual(read.call_count, 1)
+      read.reset_mock()
+
+      # a module graph with a different mtime invalidates the cache
+      stat = os.stat(module_graph)
+      os.utime(module_graph, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+      self.assertDictEqual(get_module_adjacency_list(['a', 'b'], True),
+                           transitive)
+      self.assertEqual(read.call_count, 1)
+      read.reset_mock()
+
+      # a module graph with a different size invalidates the cache
+      stat = os.stat(module_graph)
+      with open(module_graph, 'a') as f:
+        f.write(' ')
+      os.utime(module_graph, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+      self.assertDictEqual(get_module_adjacency_list(['a', 'b'], True),
+                           transitive)
+      self.assertEqual(read.call_count, 1)
+
+  def test_get_unconverted_deps(self):
+    a = bp2build_progress.ModuleInfo(
+        name='a', kind='type1', dirname='pkg', num_deps=3, created_by=None)
+    b = bp2build_progress.ModuleInfo(
+        name='b', kind='type2', dirname='pkg', num_deps=1, created_by=None)
+    c = bp2build_progress.ModuleInfo(
+        name='c', kind='type2', dirname='other', num_deps=0, created_by=None)
+    d = bp2build_progress.ModuleInfo(
+        name='d',
+        kind='//build/soong/android:android.go_android/soong.d__loadHookModule',
+        dirname='pkg',
+        num_deps=0,
+        created_by=None)
+
+    module_graph = collections.defaultdict(set)
+    module_graph[a] = set([b, c, d])
+    module_graph[b] = set([c])
+    module_graph[c].update(set())
+    module_graph[d].update(set())
+
+    unconverted = bp2build_progress.get_unconverted_deps(module_graph, {'c'})
+
+    self.assertDictEqual(unconverted, {
+        a: set([b]),
+        b: set(),
+        c: set(),
+        d: set(),
+    })
+
   def test_generate_report_data(self):
     a = bp2build_progress.ModuleInfo(
         name='a', kind='type1', dirname='pkg', num_deps=4, created_by=None)
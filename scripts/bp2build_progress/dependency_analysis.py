@@ -43,31 +43,42 @@ class _ModuleKey:
 # for brevity and simplicity. Presence in this list doesn't mean
 # that they shouldn't be converted, but that they are not that useful
 # to be recorded in the graph or report currently.
-IGNORED_KINDS = set([
+IGNORED_KINDS = frozenset({
     "cc_defaults",
     "hidl_package_root",  # not being converted, contents converted as part of hidl_interface
     "java_defaults",
     "license",
     "license_kind",
-])
+})
 
 # queryview doesn't have information on the type of deps, so we explicitly skip
 # prebuilt types
-_QUERYVIEW_IGNORE_KINDS = set([
+_QUERYVIEW_IGNORE_KINDS = frozenset({
     "android_app_import",
     "android_library_import",
     "cc_prebuilt_library",
     "cc_prebuilt_library_headers",
     "cc_prebuilt_library_shared",
     "cc_prebuilt_library_static",
-    "cc_prebuilt_library_static",
     "cc_prebuilt_object",
     "java_import",
     "java_import_host",
     "java_sdk_library_import",
-])
+})
+
+# This file is in build/bazel/scripts/bp2build_progress under the source root.
+# Symlinks are intentionally not resolved.
+SRC_ROOT_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../../../.."))
+
+# Soong outputs consumed by these scripts, relative to SRC_ROOT_DIR.
+MODULE_GRAPH_JSON = "out/soong/module-graph.json"
+CONVERTED_MODULES_TXT = "out/soong/soong_injection/metrics/converted_modules.txt"
+_QUERYVIEW_WORKSPACE = "out/soong/queryview"
 
-SRC_ROOT_DIR = os.path.abspath(__file__ + "/../../../../..")
+# Records of the environment Soong outputs were last built with by these
+# scripts, relative to SRC_ROOT_DIR.
+_BUILD_STAMP_DIR = "out/soong/bp2build_progress/build_stamps"
 
 LUNCH_ENV = {
     # Use aosp_arm as the canonical target product.
@@ -85,8 +96,34 @@ BANCHAN_ENV = {
 }
 
 
-def _build_with_soong(target, banchan_mode=False):
-  subprocess.check_output(
+def _build_stamp(output, env):
+  return {
+      "env": env,
+      "output_mtime_ns": os.stat(os.path.join(SRC_ROOT_DIR, output)).st_mtime_ns,
+  }
+
+
+def _build_with_soong(target, banchan_mode=False, output=None,
+                      reuse_output=False):
+  """Builds target with Soong.
+
+  If reuse_output is set and output was last built by these scripts with the
+  same environment, the previous build is reused as is, even if it has since
+  become stale with respect to the sources.
+  """
+  env = BANCHAN_ENV if banchan_mode else LUNCH_ENV
+  stamp_file = os.path.join(SRC_ROOT_DIR, _BUILD_STAMP_DIR, target + ".json")
+  if reuse_output and output:
+    try:
+      with open(stamp_file) as f:
+        if json.load(f) == _build_stamp(output, env):
+          return
+    except (OSError, json.JSONDecodeError):
+      pass
+
+  # soong_ui reports progress and build errors on stdout. Stream it to stderr,
+  # which soong_ui inherits, so that it does not mix with the script's output.
+  subprocess.run(
       [
           "build/soong/soong_ui.bash",
           "--make-mode",
@@ -94,9 +131,16 @@ def _build_with_soong(target, banchan_mode=False):
           target,
       ],
       cwd=SRC_ROOT_DIR,
-      env=BANCHAN_ENV if banchan_mode else LUNCH_ENV,
+      env=env,
+      stdout=sys.stderr,
+      check=True,
   )
 
+  if output:
+    os.makedirs(os.path.dirname(stamp_file), exist_ok=True)
+    with open(stamp_file, "w") as f:
+      json.dump(_build_stamp(output, env), f)
+
 
 def get_properties(json_module):
   set_properties = {}
@@ -120,43 +164,86 @@ def get_property_names(json_module):
   return get_properties(json_module).keys()
 
 
-def get_queryview_module_info(modules, banchan_mode):
-  """Returns the list of transitive dependencies of input module as built by queryview."""
-  _build_with_soong("queryview", banchan_mode)
+def _iter_queryview_rules(cmd):
+  """Yields the rule elements of the queryview xml output of cmd as they are parsed.
 
-  queryview_xml = subprocess.check_output(
-      [
-          "build/bazel/bin/bazel",
-          "query",
-          "--config=ci",
-          "--config=queryview",
-          "--output=xml",
-          # union of queries to get the deps of all Soong modules with the give names
-          " + ".join(f'deps(attr("soong_module_name", "^{m}$", //...))'
-                     for m in modules)
-      ],
-      cwd=SRC_ROOT_DIR,
-  )
-  try:
-    return xml.etree.ElementTree.fromstring(queryview_xml)
-  except xml.etree.ElementTree.ParseError as err:
-    sys.exit(f"""Could not parse XML:
-{queryview_xml}
+  Each rule is cleared once the consumer moves on to the next one, so callers
+  must extract what they need from a rule before advancing the iterator.
+  """
+  with subprocess.Popen(cmd, cwd=SRC_ROOT_DIR, stdout=subprocess.PIPE) as proc:
+    try:
+      events = xml.etree.ElementTree.iterparse(
+          proc.stdout, events=("start", "end"))
+      _, root = next(events)
+      for event, elem in events:
+        if event == "end" and elem.tag == "rule":
+          yield elem
+          elem.clear()
+          root.clear()
+    except xml.etree.ElementTree.ParseError as err:
+      # truncated output from a failed command is reported as that failure
+      if proc.wait():
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+      sys.exit(f"""Could not parse XML output of:
+{' '.join(cmd)}
 ParseError: {err}""")
+  if proc.returncode:
+    raise subprocess.CalledProcessError(proc.returncode, cmd)
 
 
-def get_json_module_info(banchan_mode=False):
-  """Returns the list of transitive dependencies of input module as provided by Soong's json module graph."""
-  _build_with_soong("json-module-graph", banchan_mode)
+def get_queryview_module_info(modules, banchan_mode, reuse_outputs=False):
+  """Returns the list of transitive dependencies of input module as built by queryview.
+
+  Modules are parsed lazily from the bazel query output as the returned
+  iterable is consumed. If reuse_outputs is set, an existing queryview
+  workspace built for the same product is used without rebuilding it.
+  """
+  _build_with_soong("queryview", banchan_mode, _QUERYVIEW_WORKSPACE,
+                    reuse_outputs)
+
+  # A single query covers all modules so that bazel evaluates them together
+  # in one invocation. This relies on reusing a warm bazel server between
+  # runs: do not pass --batch here or in scripts wrapping this one, as that
+  # reloads the queryview workspace from scratch on every invocation.
+  return _iter_queryview_rules([
+      "build/bazel/bin/bazel",
+      "query",
+      "--config=ci",
+      "--config=queryview",
+      "--output=xml",
+      # union of queries to get the deps of all Soong modules with the give names
+      " + ".join(f'deps(attr("soong_module_name", "^{m}$", //...))'
+                 for m in modules)
+  ])
+
+
+def build_json_module_graph(banchan_mode=False, reuse_outputs=False):
+  """Builds Soong's json module graph.
+
+  If reuse_outputs is set, an existing module graph built for the same product
+  is used without rebuilding it.
+  """
+  _build_with_soong("json-module-graph", banchan_mode, MODULE_GRAPH_JSON,
+                    reuse_outputs)
+
+
+def read_json_module_graph():
+  """Returns the json module graph written by the last json-module-graph build."""
   try:
-    with open(os.path.join(SRC_ROOT_DIR,"out/soong/module-graph.json")) as f:
+    with open(os.path.join(SRC_ROOT_DIR, MODULE_GRAPH_JSON)) as f:
       return json.load(f)
   except json.JSONDecodeError as err:
     sys.exit(f"""Could not decode json:
-out/soong/module-graph.json
+{MODULE_GRAPH_JSON}
 JSONDecodeError: {err}""")
 
 
+def get_json_module_info(banchan_mode=False):
+  """Returns the list of transitive dependencies of input module as provided by Soong's json module graph."""
+  build_json_module_graph(banchan_mode)
+  return read_json_module_graph()
+
+
 def _ignore_json_module(json_module, ignore_by_name):
   # windows is not a priority currently
   if is_windows_variation(json_module):
@@ -255,6 +342,16 @@ def _bazel_target_to_dir(full_target):
   return dirname[len("//"):]  # discard prefix
 
 
+# Attributes of a queryview rule that are read by _get_queryview_module, all
+# other attributes are Soong module properties that are not needed.
+_QUERYVIEW_MODULE_ATTRS = frozenset({
+    "soong_module_name",
+    "soong_module_type",
+    "soong_module_variant",
+    "srcs",
+})
+
+
 def _get_queryview_module(name_with_variant, module, kind):
   name = None
   variant = ""
@@ -264,6 +361,8 @@ def _get_queryview_module(name_with_variant, module, kind):
     attr_name = attr.attrib["name"]
     if attr.tag == "rule-input":
       deps.append(attr_name)
+    elif attr_name not in _QUERYVIEW_MODULE_ATTRS:
+      continue
     elif attr_name == "soong_module_name":
       name = attr.attrib["value"]
     elif attr_name == "soong_module_variant":
@@ -357,28 +456,30 @@ def visit_queryview_xml_module_graph_post_order(module_graph, ignored_by_name,
     queryview_module_graph_post_traversal(name_with_variant)
 
 
-def get_bp2build_converted_modules() -> Set[str]:
-  """ Returns the list of modules that bp2build can currently convert. """
-  _build_with_soong("bp2build")
+def build_bp2build(reuse_outputs=False):
+  """Runs bp2build, which generates the list of modules it can convert."""
+  _build_with_soong("bp2build", output=CONVERTED_MODULES_TXT,
+                    reuse_output=reuse_outputs)
+
+
+def read_bp2build_converted_modules() -> Set[str]:
+  """Returns the list of modules converted by the last bp2build run."""
   # Parse the list of converted module names from bp2build
-  with open(
-      os.path.join(SRC_ROOT_DIR,
-                   "out/soong/soong_injection/metrics/converted_modules.txt"),
-      "r") as f:
-    # Read line by line, excluding comments.
+  with open(os.path.join(SRC_ROOT_DIR, CONVERTED_MODULES_TXT), "r") as f:
+    # Read line by line, excluding comments and blank lines.
     # Each line is a module name.
-    ret = set(line.strip() for line in f if not line.strip().startswith("#"))
-  return ret
+    names = (line.strip() for line in f)
+    return {name for name in names if name and not name.startswith("#")}
 
 
 def get_json_module_type_info(module_type):
   """Returns the combined transitive dependency closures of all modules of module_type."""
-  _build_with_soong("json-module-graph")
+  _build_with_soong("json-module-graph", output=MODULE_GRAPH_JSON)
   # Run query.sh on the module graph for the top level module type
   result = subprocess.check_output(
       [
           "build/bazel/json_module_graph/query.sh",
-          "fullTransitiveModuleTypeDeps", "out/soong/module-graph.json",
+          "fullTransitiveModuleTypeDeps", MODULE_GRAPH_JSON,
           module_type
       ],
       cwd=SRC_ROOT_DIR,
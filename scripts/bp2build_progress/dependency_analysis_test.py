@@ -16,9 +16,14 @@
 """Tests for dependency_analysis.py."""
 
 import dependency_analysis
+import os
 import queryview_xml
 import soong_module_json
+import subprocess
+import tempfile
 import unittest
+import unittest.mock
+import xml.etree.ElementTree as ElementTree
 
 
 class DependencyAnalysisTest(unittest.TestCase):
@@ -553,6 +558,42 @@ class DependencyAnalysisTest(unittest.TestCase):
     expected_visited = ['d', 'b', 'e', 'c', 'a']
     self.assertListEqual(visited_modules, expected_visited)
 
+  @unittest.mock.patch('dependency_analysis.SRC_ROOT_DIR', os.getcwd())
+  def test_iter_queryview_rules_clears_consumed_rules(self):
+    graph = queryview_xml.make_graph([
+        queryview_xml.make_module(
+            '//pkg:a', 'a', 'module', dep_names=['//pkg:b']),
+        queryview_xml.make_module('//pkg:b', 'b', 'module'),
+    ])
+    with tempfile.NamedTemporaryFile(suffix='.xml') as f:
+      f.write(ElementTree.tostring(graph))
+      f.flush()
+
+      rules = dependency_analysis._iter_queryview_rules(['cat', f.name])
+      a = next(rules)
+      self.assertEqual(a.attrib['name'], '//pkg:a')
+      self.assertEqual(len(a), 3)
+
+      b = next(rules)
+      self.assertEqual(b.attrib['name'], '//pkg:b')
+      self.assertEqual(len(a), 0)
+
+      self.assertListEqual(list(rules), [])
+
+  @unittest.mock.patch('dependency_analysis.SRC_ROOT_DIR', os.getcwd())
+  def test_iter_queryview_rules_truncated_by_failure(self):
+    with self.assertRaises(subprocess.CalledProcessError):
+      list(
+          dependency_analysis._iter_queryview_rules(
+              ['sh', '-c', 'printf "<query><rule"; exit 1']))
+
+  @unittest.mock.patch('dependency_analysis.SRC_ROOT_DIR', os.getcwd())
+  def test_iter_queryview_rules_invalid_xml(self):
+    with self.assertRaises(SystemExit):
+      list(
+          dependency_analysis._iter_queryview_rules(
+              ['sh', '-c', 'printf "<query><rule></query>"']))
+
 
 if __name__ == '__main__':
   unittest.main()
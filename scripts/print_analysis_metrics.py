@@ -25,6 +25,15 @@ import os
 import subprocess
 import sys
 
+try:
+  from google.protobuf import json_format
+  from metrics_proto.metrics_pb2 import SoongBuildMetrics
+except ImportError:
+  # The Soong metrics python protos are only available when run through the
+  # print_analysis_metrics Bazel target, otherwise fall back to decoding the
+  # metrics with printproto.
+  SoongBuildMetrics = None
+
 
 class Event(object):
   """Contains nested event data.
@@ -41,19 +50,19 @@ class Event(object):
     self.children = list()
     self.start_time_relative_ns = 0
     self.duration_ns = 0
+    # Index of children by name, children keeps their insertion order.
+    self._children_by_name = dict()
 
   def get_child(self, name):
     "Get a child called 'name' or return None"
-    for child in self.children:
-      if child.name == name:
-        return child
-    return None
+    return self._children_by_name.get(name)
 
   def get_or_add_child(self, name):
     "Get a child called 'name', or if it isn't there, add it and return it."
-    child = self.get_child(name)
-    if not child:
+    child = self._children_by_name.get(name)
+    if child is None:
       child = Event(name)
+      self._children_by_name[name] = child
       self.children.append(child)
     return child
 
@@ -126,6 +135,52 @@ def _save_file(data, file):
   f.close()
 
 
+def _load_events_from_proto(metrics_file, save_proto_output_file):
+  """Returns the events of metrics_file, decoded with the python protos."""
+  metrics = SoongBuildMetrics()
+  with open(metrics_file, "rb") as f:
+    metrics.ParseFromString(f.read())
+
+  if save_proto_output_file != "":
+    _save_file(
+        json_format.MessageToJson(
+            metrics, preserving_proto_field_name=True).encode(),
+        save_proto_output_file)
+
+  return [{
+      "description": event.description,
+      "start_time": event.start_time,
+      "real_time": event.real_time,
+  } for event in metrics.events]
+
+
+def _load_events_with_printproto(metrics_file, save_proto_output_file):
+  """Returns the events of metrics_file, decoded with printproto."""
+  # Check the proto definition file
+  proto_file = _get_proto_output_file()
+  if not os.path.exists(proto_file):
+    raise Exception(
+        "$ANDROID_BUILD_TOP not found in environment. Have you run lunch?")
+
+  # Load the metrics file from the out dir
+  json_out = subprocess.check_output([
+      "printproto",
+      "--proto2",
+      "--raw_protocol_buffer",
+      "--json",
+      "--json_accuracy_loss_reaction=ignore",
+      "--message=soong_build_metrics.SoongBuildMetrics",
+      "--multiline",
+      "--proto=" + proto_file,
+      metrics_file,
+  ])
+
+  if save_proto_output_file != "":
+    _save_file(json_out, save_proto_output_file)
+
+  return json.loads(json_out).get("events")
+
+
 def main():
   # Parse args
   parser = argparse.ArgumentParser(description="")
@@ -139,8 +194,10 @@ def main():
       "--save-proto-output-file",
       nargs="?",
       default="",
-      help="(Optional) The file to save the output of the printproto command to."
-  )
+      help="(Optional) The file to save the metrics to as json. When the " +
+      "python protos are available this is protobuf's canonical json " +
+      "mapping, which encodes 64-bit integers as strings, rather than the " +
+      "output of the printproto command.")
   args = parser.parse_args()
 
   # Check the metrics file
@@ -148,26 +205,14 @@ def main():
   if not os.path.exists(metrics_file):
     raise Exception("File " + metrics_file + " not found. Did you run a build?")
 
-  # Check the proto definition file
-  proto_file = _get_proto_output_file()
-  if not os.path.exists(proto_file):
-    raise Exception(
-        "$ANDROID_BUILD_TOP not found in environment. Have you run lunch?")
-
-  # Load the metrics file from the out dir
-  cmd = r"""printproto --proto2 --raw_protocol_buffer --json \
-              --json_accuracy_loss_reaction=ignore \
-              --message=soong_build_metrics.SoongBuildMetrics --multiline \
-              --proto=""" + proto_file + " " + metrics_file
-  json_out = subprocess.check_output(cmd, shell=True)
-
-  if args.save_proto_output_file != "":
-    _save_file(json_out, args.save_proto_output_file)
-
-  build_output = json.loads(json_out)
+  if SoongBuildMetrics is not None:
+    raw_events = _load_events_from_proto(metrics_file,
+                                         args.save_proto_output_file)
+  else:
+    raw_events = _load_events_with_printproto(metrics_file,
+                                              args.save_proto_output_file)
 
   # Bail if there are no events
-  raw_events = build_output.get("events")
   if not raw_events:
     print("No events to display")
     return
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for print_analysis_metrics."""
+
+import json
+import os
+import tempfile
+import unittest
+
+import print_analysis_metrics
+from metrics_proto.metrics_pb2 import SoongBuildMetrics
+
+
+class PrintAnalysisMetricsTest(unittest.TestCase):
+
+  def test_load_events_from_proto(self):
+    metrics = SoongBuildMetrics()
+    metrics.events.add(description='soong_build', start_time=10, real_time=5)
+    metrics.events.add(
+        description='soong_build.mutator', start_time=11, real_time=2)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+      metrics_file = os.path.join(tmpdir, 'soong_build_metrics.pb')
+      with open(metrics_file, 'wb') as f:
+        f.write(metrics.SerializeToString())
+      json_file = os.path.join(tmpdir, 'soong_build_metrics.json')
+
+      events = print_analysis_metrics._load_events_from_proto(
+          metrics_file, json_file)
+
+      self.assertListEqual(events, [
+          {
+              'description': 'soong_build',
+              'start_time': 10,
+              'real_time': 5,
+          },
+          {
+              'description': 'soong_build.mutator',
+              'start_time': 11,
+              'real_time': 2,
+          },
+      ])
+
+      with open(json_file) as f:
+        saved = json.load(f)
+      # the canonical json mapping encodes 64-bit integers as strings
+      self.assertDictEqual(saved['events'][0], {
+          'description': 'soong_build',
+          'start_time': '10',
+          'real_time': '5',
+      })
+
+  def test_load_events_from_proto_without_output_file(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      metrics_file = os.path.join(tmpdir, 'soong_build_metrics.pb')
+      with open(metrics_file, 'wb') as f:
+        f.write(SoongBuildMetrics().SerializeToString())
+
+      events = print_analysis_metrics._load_events_from_proto(metrics_file, '')
+
+      self.assertListEqual(events, [])
+      self.assertListEqual(os.listdir(tmpdir), ['soong_build_metrics.pb'])
+
+
+if __name__ == '__main__':
+  unittest.main()